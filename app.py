@@ -5,17 +5,58 @@ Can be called by any application via REST API
 Uses Google SMTP (Gmail) for email delivery
 """
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import hmac
+import msgspec
+import orjson
 import os
 import logging
+import queue
+import re
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from functools import wraps
+import ssl
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import getaddresses
+from functools import lru_cache, wraps
 from datetime import datetime
+from typing import Annotated, Optional, Union
+from jinja2 import DictLoader, Environment
+from urllib.parse import quote, urlsplit
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson for request parsing and jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Reject oversized bodies (413) before they are read or parsed
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', str(256 * 1024)))
 CORS(app)  # Allow cross-origin requests
+# Railway terminates requests at a proxy; trust its X-Forwarded-For so
+# remote_addr is the real client (set PROXY_COUNT=0 when not proxied)
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', '1'))
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +65,15 @@ logger = logging.getLogger(__name__)
 # API Authentication
 API_KEY = os.environ.get('EMAIL_SERVICE_API_KEY', '')
 REQUIRE_AUTH = os.environ.get('REQUIRE_AUTH', 'true').lower() == 'true'
+# Expected header, encoded once; None when no key is set so nothing matches
+_EXPECTED_AUTH = f'Bearer {API_KEY}'.encode() if API_KEY else None
+
+# Per-client token bucket in front of the endpoints (0 disables)
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '20'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '40'))
+RATE_LIMIT_MAX_CLIENTS = 10000
+_buckets = OrderedDict()  # client address -> (tokens, last update), least recently seen first
+_buckets_lock = threading.Lock()
 
 # Google SMTP Configuration
 SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
@@ -33,349 +83,792 @@ SMTP_USER = os.environ.get('SMTP_USER', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 SMTP_FROM_EMAIL = os.environ.get('SMTP_FROM_EMAIL', '')
 SMTP_FROM_NAME = os.environ.get('SMTP_FROM_NAME', 'StockFolio')
+SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT', '10'))
+
+# SMTP connection pool (connections per worker process)
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '8'))
+# Gmail drops idle connections after ~10 minutes, so recycle well before that
+SMTP_CONNECTION_MAX_AGE = int(os.environ.get('SMTP_CONNECTION_MAX_AGE', '300'))
+
+
+@dataclass
+class PooledConnection:
+    """An authenticated SMTP connection and the time it was opened"""
+    server: smtplib.SMTP
+    created_at: float = field(default_factory=time.monotonic)
+
+    def expired(self):
+        return time.monotonic() - self.created_at > SMTP_CONNECTION_MAX_AGE
+
+
+_smtp_pool = queue.Queue(maxsize=SMTP_POOL_SIZE)
+# One TLS context for every connection, so the CA bundle is loaded only once
+_ssl_context = ssl.create_default_context()
+_ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
+# Caps connections in use, so a burst of greenlets cannot open one each
+_smtp_slots = threading.BoundedSemaphore(SMTP_POOL_SIZE)
+# Gmail accepts at most 100 RCPT commands per message
+SMTP_MAX_RECIPIENTS = int(os.environ.get('SMTP_MAX_RECIPIENTS', '100'))
+
+# Background delivery for requests sent with "async": true
+EMAIL_JOB_WORKERS = int(os.environ.get('EMAIL_JOB_WORKERS', '4'))
+EMAIL_JOB_MAX_RETRIES = int(os.environ.get('EMAIL_JOB_MAX_RETRIES', '5'))
+EMAIL_JOB_RETRY_BACKOFF = float(os.environ.get('EMAIL_JOB_RETRY_BACKOFF', '1'))
+EMAIL_JOB_MAX_PENDING = int(os.environ.get('EMAIL_JOB_MAX_PENDING', '1000'))
+
+_job_executor = ThreadPoolExecutor(max_workers=EMAIL_JOB_WORKERS, thread_name_prefix='email-job')
+# One slot per queued or running job, so a slow SMTP server cannot grow the backlog without bound
+_job_slots = threading.BoundedSemaphore(EMAIL_JOB_MAX_PENDING)
+
+
+# Request bodies, decoded and validated in one pass by msgspec.
+# Values that end up in message headers may not contain line breaks,
+# including every separator str.splitlines() recognises. This is checked
+# in __post_init__ rather than with msgspec.Meta(pattern=...), which
+# crashes some msgspec releases when the pattern holds non-Latin-1
+# characters and sits inside a Union.
+_LINE_BREAK = re.compile(r'[\r\n\x0b\x0c\x1c-\x1e\x85\u2028\u2029]')
+
+
+def _check_header_text(**fields):
+    """Raise ValueError if a value bound for a message header contains a line break"""
+    for name, value in fields.items():
+        for item in (value if isinstance(value, list) else [value]):
+            if _LINE_BREAK.search(item):
+                raise ValueError(f'`{name}` may not contain line breaks')
+
+
+class SendRequest(msgspec.Struct):
+    """Body of POST /send"""
+    to: str
+    subject: str
+    html: str = ''
+    text: Optional[str] = None
+    async_: bool = msgspec.field(default=False, name='async')
+
+    def __post_init__(self):
+        _check_header_text(to=self.to, subject=self.subject)
+
+
+class VerificationRequest(msgspec.Struct):
+    """Body of POST /send-verification"""
+    to: str
+    verification_url: str
+    username: Optional[str] = 'User'
+    async_: bool = msgspec.field(default=False, name='async')
+
+    def __post_init__(self):
+        _check_header_text(to=self.to)
+
+
+class PasswordResetRequest(msgspec.Struct):
+    """Body of POST /send-password-reset"""
+    to: str
+    reset_url: str
+    username: Optional[str] = 'User'
+    async_: bool = msgspec.field(default=False, name='async')
+
+    def __post_init__(self):
+        _check_header_text(to=self.to)
+
+
+class DividendAlertRequest(msgspec.Struct):
+    """Body of POST /send-dividend-alert"""
+    # A list of recipients is delivered as one message per SMTP batch
+    to: Union[str, Annotated[list[str], msgspec.Meta(min_length=1)]]
+    stock_symbol: str
+    dividend_date: str = ''
+    dividend_amount: Union[str, int, float] = ''
+    days_advance: int = 0
+    async_: bool = msgspec.field(default=False, name='async')
+
+    def __post_init__(self):
+        _check_header_text(to=self.to, stock_symbol=self.stock_symbol)
+
+
+# Email templates, compiled once at import. HTML is autoescaped so
+# user-supplied values cannot inject markup; plain text is left as-is.
+# Every email extends a shared layout that supplies the page envelope and
+# sign-off, so only the body (and optionally the signature) varies.
+LAYOUT_HTML = """\
+<html>
+<body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+{% block body %}{% endblock %}
+    <p>Best regards,<br>{% block signature %}StockFolio Team{% endblock %}</p>
+</body>
+</html>
+"""
+
+LAYOUT_TEXT = """\
+{% block body %}{% endblock %}
+
+Best regards,
+{% block signature %}StockFolio Team{% endblock %}
+
+"""
+
+_html_env = Environment(
+    loader=DictLoader({'layout': LAYOUT_HTML}),
+    autoescape=True,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+_text_env = Environment(
+    loader=DictLoader({'layout': LAYOUT_TEXT}),
+    autoescape=False,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+
+
+def safe_url(url):
+    """Percent-encode a link for an email body, dropping non-http(s) schemes"""
+    url = quote(str(url), safe=":/?&=%#~+@!$,;")
+    if urlsplit(url).scheme.lower() not in ('http', 'https'):
+        return ''
+    return url
+
+
+_html_env.filters['safe_url'] = safe_url
+_text_env.filters['safe_url'] = safe_url
+
+VERIFY_HTML = _html_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+    <h2>Verify Your StockFolio Account</h2>
+    <p>Hello {{ username }},</p>
+    <p>Thank you for signing up! Please verify your email address by clicking the button below:</p>
+    <p style="text-align: center; margin: 30px 0;">
+        <a href="{{ verification_url|safe_url }}" style="background-color: #4CAF50; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
+            Verify Email Address
+        </a>
+    </p>
+    <p>Or copy and paste this link into your browser:</p>
+    <p style="word-break: break-all; color: #666;">{{ verification_url|safe_url }}</p>
+    <p>This link will expire in 24 hours.</p>
+    <p>If you didn't create an account, please ignore this email.</p>
+{% endblock %}
+""")
+
+VERIFY_TEXT = _text_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+Verify Your StockFolio Account
+
+Hello {{ username }},
+
+Thank you for signing up! Please verify your email address by visiting:
+{{ verification_url|safe_url }}
+
+This link will expire in 24 hours.
+
+If you didn't create an account, please ignore this email.
+{% endblock %}
+""")
+
+RESET_HTML = _html_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+    <h2>Reset Your Password</h2>
+    <p>Hello {{ username }},</p>
+    <p>You requested to reset your password. Click the button below to create a new password:</p>
+    <p style="text-align: center; margin: 30px 0;">
+        <a href="{{ reset_url|safe_url }}" style="background-color: #2196F3; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
+            Reset Password
+        </a>
+    </p>
+    <p>Or copy and paste this link into your browser:</p>
+    <p style="word-break: break-all; color: #666;">{{ reset_url|safe_url }}</p>
+    <p>This link will expire in 24 hours.</p>
+    <p>If you didn't request this, please ignore this email. Your password will remain unchanged.</p>
+{% endblock %}
+""")
+
+RESET_TEXT = _text_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+Reset Your Password
+
+Hello {{ username }},
+
+You requested to reset your password. Visit this link to create a new password:
+{{ reset_url|safe_url }}
+
+This link will expire in 24 hours.
+
+If you didn't request this, please ignore this email.
+{% endblock %}
+""")
+
+DIVIDEND_HTML = _html_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+    <h2>💰 Dividend Alert: {{ stock_symbol }}</h2>
+    <p><strong>{{ stock_symbol }}</strong> is paying a dividend of <strong>${{ dividend_amount }}</strong> on <strong>{{ dividend_date }}</strong>.</p>
+    <p>This alert was sent {{ days_advance }} days in advance.</p>
+{% endblock %}
+{% block signature %}StockFolio{% endblock %}
+""")
+
+DIVIDEND_TEXT = _text_env.from_string("""\
+{% extends "layout" %}
+{% block body %}
+Dividend Alert: {{ stock_symbol }}
+
+{{ stock_symbol }} is paying a dividend of ${{ dividend_amount }} on {{ dividend_date }}.
+
+This alert was sent {{ days_advance }} days in advance.
+{% endblock %}
+{% block signature %}StockFolio{% endblock %}
+""")
+
+EMAIL_TEMPLATES = {
+    'verification': (VERIFY_HTML, VERIFY_TEXT),
+    'password_reset': (RESET_HTML, RESET_TEXT),
+    'dividend_alert': (DIVIDEND_HTML, DIVIDEND_TEXT),
+}
+
+# Rendered template messages kept for reuse (dividend alerts fan out identical content).
+# Verification and reset emails carry one-time URLs, so caching them would never hit
+# and would only keep live tokens in memory.
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '1024'))
+CACHED_TEMPLATES = frozenset({'dividend_alert'})
+
+
+def _take_token(client):
+    """Spend one token from the client's bucket, returning False when it is empty"""
+    now = time.monotonic()
+    with _buckets_lock:
+        if client in _buckets:
+            _buckets.move_to_end(client)
+            tokens, updated = _buckets[client]
+        else:
+            if len(_buckets) >= RATE_LIMIT_MAX_CLIENTS:
+                # Forget the least recently seen client so the table stays bounded
+                _buckets.popitem(last=False)
+            tokens, updated = RATE_LIMIT_BURST, now
+        
+        tokens = min(RATE_LIMIT_BURST, tokens + (now - updated) * RATE_LIMIT_PER_SECOND)
+        allowed = tokens >= 1
+        _buckets[client] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+def rate_limit(f):
+    """Decorator to reject requests over the per-client rate with 429"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if RATE_LIMIT_PER_SECOND > 0 and not _take_token(request.remote_addr):
+            return jsonify({'error': 'Too many requests'}), 429, {'Retry-After': '1'}
+        return f(*args, **kwargs)
+    return decorated_function
 
 
 def require_auth(f):
     """Decorator to require API key authentication"""
+    # Config is fixed at import, so bind it as defaults (fast locals per call)
     @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if REQUIRE_AUTH:
-            auth_header = request.headers.get('Authorization')
-            if not auth_header or auth_header != f'Bearer {API_KEY}':
+    def decorated_function(*args, _require=REQUIRE_AUTH, _expected=_EXPECTED_AUTH, **kwargs):
+        if _require:
+            auth_header = request.headers.get('Authorization', '').encode()
+            # Constant-time comparison so the key cannot be guessed byte by byte
+            if _expected is None or not hmac.compare_digest(auth_header, _expected):
                 return jsonify({'error': 'Unauthorized'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
 
-def send_email_via_smtp(to_email, subject, html_content, text_content=None):
-    """Send email via Google SMTP (PRIMARY METHOD)"""
-    if not SMTP_USER or not SMTP_PASSWORD or not SMTP_FROM_EMAIL:
-        return False, "SMTP not configured"
+def _open_smtp_connection():
+    """Connect and log in to the SMTP server"""
+    if SMTP_USE_TLS:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT, context=_ssl_context)
     
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
-        msg['To'] = to_email
-        
-        # Add text and HTML parts
-        if text_content:
-            text_part = MIMEText(text_content, 'plain')
-            msg.attach(text_part)
-        
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
-        
-        # Connect to SMTP server
         if SMTP_USE_TLS:
-            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-            server.starttls()
-        else:
-            server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT)
-        
-        # Login and send
+            server.starttls(context=_ssl_context)
         server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        
-        logger.info(f"Email sent via SMTP to {to_email}")
+    except Exception:
+        server.close()
+        raise
+    
+    return PooledConnection(server)
+
+
+def _close_smtp_connection(conn):
+    """Close a pooled connection, ignoring errors from dead sockets"""
+    try:
+        conn.server.quit()
+    except (smtplib.SMTPException, OSError):
+        conn.server.close()
+
+
+def _checkout_smtp_connection():
+    """Take a live connection from the pool, opening a new one if none is idle"""
+    while True:
+        try:
+            conn = _smtp_pool.get_nowait()
+        except queue.Empty:
+            return _open_smtp_connection()
+        
+        if not conn.expired():
+            try:
+                code, _ = conn.server.noop()
+            except (smtplib.SMTPException, OSError):
+                code = None
+            if code == 250:
+                return conn
+        
+        _close_smtp_connection(conn)
+
+
+def _release_smtp_connection(conn):
+    """Return a connection to the pool, closing it if the pool is full"""
+    try:
+        _smtp_pool.put_nowait(conn)
+    except queue.Full:
+        _close_smtp_connection(conn)
+
+
+def smtp_configured():
+    """Check that the SMTP credentials and sender are set"""
+    return bool(SMTP_USER and SMTP_PASSWORD and SMTP_FROM_EMAIL)
+
+
+def build_message(subject, html_content, text_content=None):
+    """Serialize a message without its To header, so it can be addressed per send"""
+    # Create message; the SMTP policy emits CRLF wire format and picks the
+    # cheapest transfer encoding per part
+    msg = EmailMessage(policy=SMTP_POLICY)
+    msg['Subject'] = subject
+    msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
+    
+    # HTML-only messages are a single text/html part; multipart/alternative
+    # is only needed when there is a plain-text version to offer
+    if text_content:
+        msg.set_content(text_content)
+        msg.add_alternative(html_content, subtype='html')
+    else:
+        msg.set_content(html_content, subtype='html')
+    
+    return msg.as_bytes()
+
+
+def _render_templated_message(template_id, subject, context):
+    """Render a template pair into message bytes"""
+    html_template, text_template = EMAIL_TEMPLATES[template_id]
+    return build_message(subject, html_template.render(context), text_template.render(context))
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_cached_message(template_id, subject, frozen_context):
+    """Render a template pair into message bytes (cached)"""
+    return _render_templated_message(template_id, subject, dict(frozen_context))
+
+
+def build_templated_message(template_id, subject, **context):
+    """Build message bytes from one of EMAIL_TEMPLATES, reusing identical renders where they can repeat"""
+    if template_id not in CACHED_TEMPLATES:
+        return _render_templated_message(template_id, subject, context)
+    # Templates render every value through str(), so freezing the values as
+    # strings keeps the cache key hashable without changing the output
+    frozen_context = tuple(sorted((key, str(value)) for key, value in context.items()))
+    return _render_cached_message(template_id, subject, frozen_context)
+
+
+class PartialDeliveryError(Exception):
+    """Delivery failed after some recipient batches had already been sent"""
+    
+    def __init__(self, error, delivered, remaining):
+        super().__init__(
+            f"{error} (sent to {len(delivered)} recipient(s), {len(remaining)} not sent)"
+        )
+        self.error = error
+        self.delivered = delivered
+        self.remaining = remaining
+
+
+def _deliver_via_smtp(to_email, message, recipients=None):
+    """Address and send prepared message bytes over a pooled connection, raising on failure
+    
+    to_email may be a list, in which case one message is sent to batches of
+    recipients without disclosing them to each other. recipients overrides
+    who is sent the message (e.g. to retry only the undelivered part of a
+    list) without changing its To header. If a batch fails after earlier
+    batches went out, PartialDeliveryError reports who still needs it.
+    """
+    if isinstance(to_email, str):
+        # header_store_parse rejects CR/LF, so the address cannot inject headers
+        to_header = SMTP_POLICY.fold_binary(*SMTP_POLICY.header_store_parse('To', to_email))
+        # A To value may list several addresses ("a@x.com, b@y.com"); every
+        # one of them needs its own RCPT, as send_message used to issue
+        addresses = [address for _, address in getaddresses([to_email]) if address]
+        if not addresses:
+            raise ValueError(f"No recipient address in {to_email!r}")
+    else:
+        addresses = list(to_email)
+        to_header = b'To: undisclosed-recipients:;\r\n'
+    if recipients is None:
+        recipients = addresses
+    
+    # Send over a pooled connection; a connection that failed
+    # mid-transaction is discarded rather than returned to the pool
+    delivered = []
+    with _smtp_slots:
+        conn = _checkout_smtp_connection()
+        try:
+            for start in range(0, len(recipients), SMTP_MAX_RECIPIENTS):
+                batch = recipients[start:start + SMTP_MAX_RECIPIENTS]
+                refused = conn.server.sendmail(SMTP_FROM_EMAIL, batch, to_header + message)
+                for address, (code, reply) in refused.items():
+                    logger.warning("SMTP refused recipient %s: %s %s", address, code, reply)
+                delivered.extend(address for address in batch if address not in refused)
+        except BaseException as e:
+            _close_smtp_connection(conn)
+            if delivered and isinstance(e, Exception):
+                raise PartialDeliveryError(e, delivered, recipients[start:]) from e
+            raise
+        _release_smtp_connection(conn)
+
+
+def send_email_via_smtp(to_email, message):
+    """Send prepared message bytes via Google SMTP (PRIMARY METHOD)
+    
+    PartialDeliveryError propagates so the response can say who was sent the email.
+    """
+    if not smtp_configured():
+        return False, "SMTP not configured"
+    
+    try:
+        _deliver_via_smtp(to_email, message)
+        logger.info("Email sent via SMTP to %s", to_email)
         return True, "Success"
+    except PartialDeliveryError as e:
+        logger.error("SMTP error: %s", e)
+        raise
     except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"SMTP authentication failed: {e}")
+        logger.error("SMTP authentication failed: %s", e)
         return False, f"SMTP authentication failed: {str(e)}"
     except smtplib.SMTPException as e:
-        logger.error(f"SMTP error: {e}")
+        logger.error("SMTP error: %s", e)
         return False, f"SMTP error: {str(e)}"
     except Exception as e:
-        logger.error(f"SMTP error: {e}")
+        logger.error("SMTP error: %s", e)
         return False, str(e)
 
 
 def send_email(to_email, subject, html_content, text_content=None):
     """Send email via Google SMTP"""
-    return send_email_via_smtp(to_email, subject, html_content, text_content)
+    return send_email_via_smtp(to_email, build_message(subject, html_content, text_content))
+
+
+def _is_transient_smtp_error(error):
+    """Whether a failed delivery may succeed if retried later"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 4xx replies are temporary; 5xx replies (including bad credentials) are final
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # Socket errors and timeouts (SMTPException itself subclasses OSError)
+    return isinstance(error, OSError)
+
+
+def _run_email_job(job_id, to_email, message):
+    """Deliver a queued email, retrying transient SMTP failures with exponential backoff
+    
+    Returns None once delivered, otherwise the last error message.
+    """
+    # Recipients still owed the email; a partial failure retries only the rest
+    pending = None
+    for attempt in range(1, EMAIL_JOB_MAX_RETRIES + 2):
+        try:
+            _deliver_via_smtp(to_email, message, pending)
+        except Exception as e:
+            if isinstance(e, PartialDeliveryError):
+                pending, e = e.remaining, e.error
+            error = f"SMTP error: {str(e)}" if isinstance(e, smtplib.SMTPException) else str(e)
+            if not _is_transient_smtp_error(e) or attempt > EMAIL_JOB_MAX_RETRIES:
+                break
+            time.sleep(EMAIL_JOB_RETRY_BACKOFF * 2 ** (attempt - 1))
+        else:
+            logger.info("Email job %s sent via SMTP to %s", job_id, to_email)
+            return None
+    
+    logger.error("Email job %s to %s failed after %s attempt(s): %s", job_id, to_email, attempt, error)
+    return error
+
+
+def enqueue_email(to_email, message):
+    """Queue prepared message bytes for background delivery
+    
+    Returns the job id, or None when EMAIL_JOB_MAX_PENDING jobs are already waiting.
+    """
+    if not _job_slots.acquire(blocking=False):
+        return None
+    job_id = uuid.uuid4().hex
+    future = _job_executor.submit(_run_email_job, job_id, to_email, message)
+    future.add_done_callback(lambda _: _job_slots.release())
+    return job_id
+
+
+def queue_email_response(to_email, message, queued_message):
+    """Queue message bytes and answer 202, or 500/503 when the job cannot be queued"""
+    if not smtp_configured():
+        return jsonify({
+            'success': False,
+            'error': 'SMTP not configured'
+        }), 500
+    
+    job_id = enqueue_email(to_email, message)
+    if job_id is None:
+        return jsonify({
+            'success': False,
+            'error': 'Email queue is full, try again later'
+        }), 503, {'Retry-After': '5'}
+    
+    return jsonify({
+        'success': True,
+        'message': queued_message,
+        'job_id': job_id
+    }), 202
+
+
+# Success bodies for the fixed-payload endpoints, encoded once
+_SEND_OK = {
+    'success': True,
+    'message': 'Email sent successfully',
+    'service_used': 'smtp'
+}
+_VERIFICATION_SENT = orjson.dumps({
+    'success': True,
+    'message': 'Verification email sent',
+    'service_used': 'smtp'
+})
+_PASSWORD_RESET_SENT = orjson.dumps({
+    'success': True,
+    'message': 'Password reset email sent',
+    'service_used': 'smtp'
+})
+_DIVIDEND_ALERT_SENT = orjson.dumps({
+    'success': True,
+    'message': 'Dividend alert sent',
+    'service_used': 'smtp'
+})
+
+
+def json_response(body, status=200):
+    """Wrap already-encoded JSON bytes in a response, skipping jsonify"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+# /health is polled frequently, so the encoded body is reused for up to
+# HEALTH_CACHE_TTL seconds; (timestamp, body) is swapped in as one tuple
+HEALTH_CACHE_TTL = 1
+_health_cache = (0.0, b'')
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """Return oversized-body rejections as JSON like the other errors"""
+    return jsonify({
+        'success': False,
+        'error': f"Request body exceeds {app.config['MAX_CONTENT_LENGTH']} bytes"
+    }), 413
+
+
+@app.errorhandler(PartialDeliveryError)
+def partial_delivery(e):
+    """Report which recipients were sent the email before delivery failed"""
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        'delivered': e.delivered,
+        'undelivered': e.remaining
+    }), 500
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'email-service',
-        'timestamp': datetime.utcnow().isoformat()
-    })
+    global _health_cache
+    now = time.time()
+    cached_at, body = _health_cache
+    if now - cached_at > HEALTH_CACHE_TTL:
+        body = orjson.dumps({
+            'status': 'healthy',
+            'service': 'email-service',
+            'timestamp': datetime.utcfromtimestamp(now).isoformat()
+        })
+        _health_cache = (now, body)
+    return json_response(body)
 
 
 @app.route('/send', methods=['POST'])
+@rate_limit
 @require_auth
 def send_email_endpoint():
     """Main email sending endpoint"""
     try:
-        data = request.json
-        
-        # Validate required fields
-        if not data or 'to' not in data or 'subject' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required fields: to, subject'
-            }), 400
-        
-        to_email = data['to']
-        subject = data['subject']
-        html_content = data.get('html', '')
-        text_content = data.get('text', '')
-        
-        # Send email
-        success, message, service_used = send_email(to_email, subject, html_content, text_content)
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Email sent successfully',
-                'service_used': 'smtp',
-                'to': to_email
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': message,
-                'to': to_email
-            }), 500
-            
-    except Exception as e:
-        logger.error(f"Error in send_email_endpoint: {e}")
+        req = msgspec.json.decode(request.get_data(cache=False), type=SendRequest, strict=False)
+    except msgspec.DecodeError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid request: {e}'
+        }), 400
+    
+    to_email = req.to
+    subject = req.subject
+    html_content = req.html
+    text_content = req.text
+    
+    if req.async_:
+        return queue_email_response(to_email, build_message(subject, html_content, text_content), 'Email queued')
+    
+    # Send email
+    success, message = send_email(to_email, subject, html_content, text_content)
+    
+    if success:
+        return json_response(orjson.dumps({**_SEND_OK, 'to': to_email}))
+    else:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': message,
+            'to': to_email
         }), 500
 
 
 @app.route('/send-verification', methods=['POST'])
+@rate_limit
 @require_auth
 def send_verification_email():
     """Send email verification email"""
     try:
-        data = request.json
-        
-        if not data or 'to' not in data or 'verification_url' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required fields: to, verification_url'
-            }), 400
-        
-        to_email = data['to']
-        verification_url = data['verification_url']
-        username = data.get('username', 'User')
-        
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2>Verify Your StockFolio Account</h2>
-            <p>Hello {username},</p>
-            <p>Thank you for signing up! Please verify your email address by clicking the button below:</p>
-            <p style="text-align: center; margin: 30px 0;">
-                <a href="{verification_url}" style="background-color: #4CAF50; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                    Verify Email Address
-                </a>
-            </p>
-            <p>Or copy and paste this link into your browser:</p>
-            <p style="word-break: break-all; color: #666;">{verification_url}</p>
-            <p>This link will expire in 24 hours.</p>
-            <p>If you didn't create an account, please ignore this email.</p>
-            <p>Best regards,<br>StockFolio Team</p>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Verify Your StockFolio Account
-        
-        Hello {username},
-        
-        Thank you for signing up! Please verify your email address by visiting:
-        {verification_url}
-        
-        This link will expire in 24 hours.
-        
-        If you didn't create an account, please ignore this email.
-        
-        Best regards,
-        StockFolio Team
-        """
-        
-        success, message = send_email(
-            to_email, 
-            'Verify Your StockFolio Account',
-            html_content,
-            text_content
-        )
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Verification email sent',
-                'service_used': 'smtp'
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': message
-            }), 500
-            
-    except Exception as e:
-        logger.error(f"Error in send_verification_email: {e}")
+        req = msgspec.json.decode(request.get_data(cache=False), type=VerificationRequest, strict=False)
+    except msgspec.DecodeError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid request: {e}'
+        }), 400
+    
+    to_email = req.to
+    verification_url = req.verification_url
+    username = req.username or 'User'
+    
+    if not safe_url(verification_url):
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': 'verification_url must be an http(s) URL'
+        }), 400
+    
+    message = build_templated_message(
+        'verification',
+        'Verify Your StockFolio Account',
+        username=username,
+        verification_url=verification_url
+    )
+    
+    if req.async_:
+        return queue_email_response(to_email, message, 'Verification email queued')
+    
+    success, error = send_email_via_smtp(to_email, message)
+    
+    if success:
+        return json_response(_VERIFICATION_SENT)
+    else:
+        return jsonify({
+            'success': False,
+            'error': error
         }), 500
 
 
 @app.route('/send-password-reset', methods=['POST'])
+@rate_limit
 @require_auth
 def send_password_reset():
     """Send password reset email"""
     try:
-        data = request.json
-        
-        if not data or 'to' not in data or 'reset_url' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required fields: to, reset_url'
-            }), 400
-        
-        to_email = data['to']
-        reset_url = data['reset_url']
-        username = data.get('username', 'User')
-        
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2>Reset Your Password</h2>
-            <p>Hello {username},</p>
-            <p>You requested to reset your password. Click the button below to create a new password:</p>
-            <p style="text-align: center; margin: 30px 0;">
-                <a href="{reset_url}" style="background-color: #2196F3; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                    Reset Password
-                </a>
-            </p>
-            <p>Or copy and paste this link into your browser:</p>
-            <p style="word-break: break-all; color: #666;">{reset_url}</p>
-            <p>This link will expire in 24 hours.</p>
-            <p>If you didn't request this, please ignore this email. Your password will remain unchanged.</p>
-            <p>Best regards,<br>StockFolio Team</p>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Reset Your Password
-        
-        Hello {username},
-        
-        You requested to reset your password. Visit this link to create a new password:
-        {reset_url}
-        
-        This link will expire in 24 hours.
-        
-        If you didn't request this, please ignore this email.
-        
-        Best regards,
-        StockFolio Team
-        """
-        
-        success, message = send_email(
-            to_email,
-            'Reset Your StockFolio Password',
-            html_content,
-            text_content
-        )
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Password reset email sent',
-                'service_used': 'smtp'
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': message
-            }), 500
-            
-    except Exception as e:
-        logger.error(f"Error in send_password_reset: {e}")
+        req = msgspec.json.decode(request.get_data(cache=False), type=PasswordResetRequest, strict=False)
+    except msgspec.DecodeError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid request: {e}'
+        }), 400
+    
+    to_email = req.to
+    reset_url = req.reset_url
+    username = req.username or 'User'
+    
+    if not safe_url(reset_url):
+        return jsonify({
+            'success': False,
+            'error': 'reset_url must be an http(s) URL'
+        }), 400
+    
+    message = build_templated_message(
+        'password_reset',
+        'Reset Your StockFolio Password',
+        username=username,
+        reset_url=reset_url
+    )
+    
+    if req.async_:
+        return queue_email_response(to_email, message, 'Password reset email queued')
+    
+    success, error = send_email_via_smtp(to_email, message)
+    
+    if success:
+        return json_response(_PASSWORD_RESET_SENT)
+    else:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': error
         }), 500
 
 
 @app.route('/send-dividend-alert', methods=['POST'])
+@rate_limit
 @require_auth
 def send_dividend_alert():
     """Send dividend alert email"""
     try:
-        data = request.json
-        
-        if not data or 'to' not in data or 'stock_symbol' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required fields: to, stock_symbol'
-            }), 400
-        
-        to_email = data['to']
-        stock_symbol = data['stock_symbol']
-        dividend_date = data.get('dividend_date', '')
-        dividend_amount = data.get('dividend_amount', '')
-        days_advance = data.get('days_advance', 0)
-        
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2>💰 Dividend Alert: {stock_symbol}</h2>
-            <p><strong>{stock_symbol}</strong> is paying a dividend of <strong>${dividend_amount}</strong> on <strong>{dividend_date}</strong>.</p>
-            <p>This alert was sent {days_advance} days in advance.</p>
-            <p>Best regards,<br>StockFolio</p>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Dividend Alert: {stock_symbol}
-        
-        {stock_symbol} is paying a dividend of ${dividend_amount} on {dividend_date}.
-        
-        This alert was sent {days_advance} days in advance.
-        
-        Best regards,
-        StockFolio
-        """
-        
-        success, message = send_email(
-            to_email,
-            f'{stock_symbol} Dividend Alert ({days_advance} days early)',
-            html_content,
-            text_content
-        )
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Dividend alert sent',
-                'service_used': 'smtp'
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': message
-            }), 500
-            
-    except Exception as e:
-        logger.error(f"Error in send_dividend_alert: {e}")
+        req = msgspec.json.decode(request.get_data(cache=False), type=DividendAlertRequest, strict=False)
+    except msgspec.DecodeError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid request: {e}'
+        }), 400
+    
+    to_email = req.to
+    stock_symbol = req.stock_symbol
+    dividend_date = req.dividend_date
+    dividend_amount = req.dividend_amount
+    days_advance = req.days_advance
+    
+    message = build_templated_message(
+        'dividend_alert',
+        f'{stock_symbol} Dividend Alert ({days_advance} days early)',
+        stock_symbol=stock_symbol,
+        dividend_amount=dividend_amount,
+        dividend_date=dividend_date,
+        days_advance=days_advance
+    )
+    
+    if req.async_:
+        return queue_email_response(to_email, message, 'Dividend alert queued')
+    
+    success, error = send_email_via_smtp(to_email, message)
+    
+    if success:
+        return json_response(_DIVIDEND_ALERT_SENT)
+    else:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': error
         }), 500
 
 
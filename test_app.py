@@ -0,0 +1,237 @@
+"""
+Tests for the email service endpoints
+SMTP is replaced by an in-memory stub, so no mail is sent
+"""
+import os
+
+# Config is read at import time, so it must be set before app is imported
+os.environ['REQUIRE_AUTH'] = 'false'
+os.environ['SMTP_USER'] = 'user@example.com'
+os.environ['SMTP_PASSWORD'] = 'password'
+os.environ['SMTP_FROM_EMAIL'] = 'from@example.com'
+
+import queue
+import smtplib
+from collections import OrderedDict
+
+import pytest
+
+import app as email_app
+
+
+class StubSMTP:
+    """Records sendmail calls instead of talking to a server"""
+    sent = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def starttls(self, **kwargs):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b'OK'
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        self.sent.append((from_addr, list(to_addrs), msg))
+        return {}
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    StubSMTP.sent = []
+    monkeypatch.setattr(email_app, '_buckets', OrderedDict())
+    monkeypatch.setattr(email_app.smtplib, 'SMTP', StubSMTP)
+    monkeypatch.setattr(email_app, '_smtp_pool', queue.Queue(maxsize=email_app.SMTP_POOL_SIZE))
+    return email_app.app.test_client()
+
+
+def test_send_returns_200(client):
+    response = client.post('/send', json={
+        'to': 'user@example.com',
+        'subject': 'Test Email',
+        'html': '<h1>Hello</h1>',
+        'text': 'Hello'
+    })
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'success': True,
+        'message': 'Email sent successfully',
+        'service_used': 'smtp',
+        'to': 'user@example.com'
+    }
+    assert len(StubSMTP.sent) == 1
+    assert StubSMTP.sent[0][1] == ['user@example.com']
+
+
+def test_send_delivers_to_every_address_in_to(client):
+    response = client.post('/send', json={
+        'to': 'a@example.com, Bee <b@example.com>',
+        'subject': 'Test Email',
+        'html': '<p>Hello</p>'
+    })
+
+    assert response.status_code == 200
+    assert StubSMTP.sent[0][1] == ['a@example.com', 'b@example.com']
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/send', {'to': 'user@example.com', 'subject': 'hi\nBcc: evil@example.com'}),
+    ('/send', {'to': 'user@example.com', 'subject': 'hi\n'}),
+    ('/send', {'to': 'user@example.com', 'subject': 'hi\u2028there'}),
+    ('/send-dividend-alert', {'to': 'user@example.com', 'stock_symbol': 'AAPL\r\nX: y'}),
+    ('/send-dividend-alert', {'to': 'user@example.com', 'stock_symbol': 'AAPL\n'}),
+    ('/send-dividend-alert', {'to': 'user@example.com', 'stock_symbol': 'AAPL\x85'}),
+])
+def test_line_breaks_in_header_fields_are_rejected(client, path, body):
+    response = client.post(path, json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert StubSMTP.sent == []
+
+
+def test_async_send_without_smtp_config_returns_500(client, monkeypatch):
+    monkeypatch.setattr(email_app, 'SMTP_PASSWORD', '')
+    monkeypatch.setattr(email_app, 'enqueue_email', lambda *args: pytest.fail('job was queued'))
+
+    response = client.post('/send', json={
+        'to': 'user@example.com',
+        'subject': 'Test Email',
+        'async': True
+    })
+
+    assert response.status_code == 500
+    assert response.get_json() == {'success': False, 'error': 'SMTP not configured'}
+
+
+def test_async_send_returns_503_when_job_queue_is_full(client, monkeypatch):
+    monkeypatch.setattr(email_app, '_job_slots', email_app.threading.BoundedSemaphore(1))
+    email_app._job_slots.acquire()
+
+    response = client.post('/send', json={
+        'to': 'user@example.com',
+        'subject': 'Test Email',
+        'async': True
+    })
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert response.get_json()['success'] is False
+
+
+def test_only_dividend_alerts_are_cached(client):
+    email_app._render_cached_message.cache_clear()
+
+    client.post('/send-verification', json={
+        'to': 'user@example.com',
+        'verification_url': 'https://example.com/verify?token=secret'
+    })
+    assert email_app._render_cached_message.cache_info().currsize == 0
+
+    client.post('/send-dividend-alert', json={'to': 'user@example.com', 'stock_symbol': 'AAPL'})
+    assert email_app._render_cached_message.cache_info().currsize == 1
+    assert len(StubSMTP.sent) == 2
+
+
+def test_client_over_burst_gets_429(client, monkeypatch):
+    monkeypatch.setattr(email_app, 'RATE_LIMIT_BURST', 2)
+    monkeypatch.setattr(email_app, 'RATE_LIMIT_PER_SECOND', 0.001)
+
+    responses = [client.post('/send', json={'to': 'user@example.com', 'subject': 'Hi'}) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[-1].headers['Retry-After'] == '1'
+    assert len(StubSMTP.sent) == 2
+
+
+def test_rate_limiter_evicts_least_recently_seen_client(client, monkeypatch):
+    monkeypatch.setattr(email_app, 'RATE_LIMIT_MAX_CLIENTS', 2)
+
+    for address in ['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3']:
+        email_app._take_token(address)
+
+    assert list(email_app._buckets) == ['10.0.0.1', '10.0.0.3']
+
+
+class FailingSMTP(StubSMTP):
+    """Fails every sendmail with the error in `error`"""
+    error = None
+    calls = 0
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        FailingSMTP.calls += 1
+        raise self.error
+
+
+@pytest.mark.parametrize('error, attempts', [
+    (smtplib.SMTPRecipientsRefused({'user@example.com': (550, b'No such user')}), 1),
+    (smtplib.SMTPDataError(554, b'Rejected'), 1),
+    (smtplib.SMTPDataError(451, b'Try again later'), 3),
+    (smtplib.SMTPServerDisconnected('Connection lost'), 3),
+])
+def test_background_jobs_retry_only_transient_errors(client, monkeypatch, error, attempts):
+    FailingSMTP.error, FailingSMTP.calls = error, 0
+    monkeypatch.setattr(email_app.smtplib, 'SMTP', FailingSMTP)
+    monkeypatch.setattr(email_app, 'EMAIL_JOB_MAX_RETRIES', 2)
+    monkeypatch.setattr(email_app, 'EMAIL_JOB_RETRY_BACKOFF', 0)
+    error = email_app._run_email_job('job', 'user@example.com', email_app.build_message('Subject', '<p>Hi</p>'))
+
+    assert FailingSMTP.calls == attempts
+    assert error
+
+
+class FlakySMTP(StubSMTP):
+    """Drops the connection on the second sendmail, then recovers"""
+    calls = 0
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        FlakySMTP.calls += 1
+        if FlakySMTP.calls == 2:
+            raise smtplib.SMTPServerDisconnected('Connection lost')
+        return super().sendmail(from_addr, to_addrs, msg)
+
+
+DIVIDEND_SUBSCRIBERS = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+
+
+def test_background_retry_resends_only_undelivered_batches(client, monkeypatch):
+    FlakySMTP.calls = 0
+    monkeypatch.setattr(email_app.smtplib, 'SMTP', FlakySMTP)
+    monkeypatch.setattr(email_app, 'SMTP_MAX_RECIPIENTS', 2)
+    monkeypatch.setattr(email_app, 'EMAIL_JOB_RETRY_BACKOFF', 0)
+    error = email_app._run_email_job('job', DIVIDEND_SUBSCRIBERS, email_app.build_message('Subject', '<p>Hi</p>'))
+
+    assert [to for _, to, _ in StubSMTP.sent] == [
+        ['a@example.com', 'b@example.com'],
+        ['c@example.com', 'd@example.com'],
+    ]
+    assert FlakySMTP.calls == 3
+    assert error is None
+
+
+def test_partial_dividend_delivery_reports_who_was_sent(client, monkeypatch):
+    FlakySMTP.calls = 0
+    monkeypatch.setattr(email_app.smtplib, 'SMTP', FlakySMTP)
+    monkeypatch.setattr(email_app, 'SMTP_MAX_RECIPIENTS', 2)
+
+    response = client.post('/send-dividend-alert', json={
+        'to': DIVIDEND_SUBSCRIBERS,
+        'stock_symbol': 'AAPL'
+    })
+
+    assert response.status_code == 500
+    body = response.get_json()
+    assert body['success'] is False
+    assert body['delivered'] == ['a@example.com', 'b@example.com']
+    assert body['undelivered'] == ['c@example.com', 'd@example.com']